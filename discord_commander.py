@@ -4,22 +4,36 @@ from discord.ext import commands
 import g4f
 import subprocess
 import json
+import locale
+import os
+import signal
 import re
 from datetime import datetime
 from typing import List, Dict, Optional
 import flet as ft
 import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
 import queue
 import hashlib
-import pickle
+import orjson
 
-CONFIG_PATH = 'config.pkl'
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+CONFIG_PATH = 'config.json'
+OUTPUT_TAIL_BYTES = 4096  # Сколько последних байт вывода команды хранить
+OUTPUT_DRAIN_TIMEOUT = 2  # Сколько секунд дочитывать вывод после завершения команды
+MESSAGE_LIMIT = 1800  # Максимальная длина ответа бота в Discord
 DEFAULT_CONFIG = {
     "discord_token": "",
     "command_prefix": "!",
     "os_type": "windows",  # windows или linux
     "model_type": "g4f",  # g4f или ollama
-    "g4f_model": g4f.models.gpt_4,  # Модель G4F
+    "g4f_model_name": g4f.models.gpt_4.name,  # Имя модели G4F
     "ollama_model": "",  # Выбранная модель Ollama
     "message_history_limit": 50,
     "dangerous_commands": [
@@ -32,127 +46,240 @@ DEFAULT_CONFIG = {
     "max_command_length": 1000
 }
 
+RISK_LEVELS = ("low", "medium", "medium", "high")  # По числу найденных опасных команд
+COMMAND_LINE_RE = re.compile(r'^[^\S\n]*COMMAND:(.*)\n?', re.MULTILINE)
+
+@dataclass(slots=True)
+class SecurityResult:
+    safe: bool = True
+    risk_level: str = "low"
+    warnings: List[str] = field(default_factory=list)
+    dangerous_parts: List[str] = field(default_factory=list)
+
 class SecurityChecker:
     def __init__(self, dangerous_commands: List[str]):
-        self.dangerous_commands = dangerous_commands
+        self.update_dangerous_commands(dangerous_commands)
         self.suspicious_patterns = [
-            r'[\|&;]',  # Pipe и chain операторы
-            r'>\s*[/\\]',  # Redirection в системные папки
-            r'<.*>',  # Потенциальные redirection
-            r'\$\([^)]*\)',  # Command substitution
-            r'`[^`]*`',  # Backtick execution
+            # Possessive-квантификаторы не дают движку откатываться на входе
+            # с множеством незакрытых "$(", "<" или "`". Поиск "$(" остаётся
+            # квадратичным (каждое вхождение просматривается до ")"), но длина
+            # команды ограничена max_command_length
+            r'[|&;]',  # Pipe и chain операторы
+            r'>\s*+[/\\]',  # Redirection в системные папки
+            r'<[^<>]*+>',  # Потенциальные redirection
+            r'\$\([^)]*+\)',  # Command substitution
+            r'`[^`]*+`',  # Backtick execution
         ]
+        # Lookahead не поглощает символы, поэтому паттерны не перекрывают друг друга
+        self.suspicious_re = re.compile('(?=' + '|'.join(
+            f'(?P<p{i}>{pattern})' for i, pattern in enumerate(self.suspicious_patterns)
+        ) + ')')
+    
+    def update_dangerous_commands(self, dangerous_commands: List[str]):
+        """Обновляет список опасных команд и перестраивает автомат поиска"""
+        self.dangerous_commands = dangerous_commands
+        self.dangerous_commands_lower = [(cmd, cmd.lower()) for cmd in dangerous_commands]
+        if ahocorasick:
+            self.automaton = ahocorasick.Automaton()
+            for dangerous_cmd, dangerous_cmd_lower in self.dangerous_commands_lower:
+                self.automaton.add_word(dangerous_cmd_lower, dangerous_cmd)
+            self.automaton.make_automaton()
+        else:
+            # Без pyahocorasick используем префиксное дерево из вложенных словарей
+            self.trie = {}
+            for dangerous_cmd, dangerous_cmd_lower in self.dangerous_commands_lower:
+                node = self.trie
+                for char in dangerous_cmd_lower:
+                    node = node.setdefault(char, {})
+                node["_end"] = dangerous_cmd
     
-    def check_command(self, command: str) -> Dict:
+    def _find_dangerous_commands(self, command_lower: str):
+        """Возвращает все вхождения опасных команд в команду"""
+        if not self.dangerous_commands:
+            return
+        
+        if ahocorasick:
+            for _, dangerous_cmd in self.automaton.iter(command_lower):
+                yield dangerous_cmd
+            return
+        
+        for start in range(len(command_lower)):
+            node = self.trie
+            for i in range(start, len(command_lower)):
+                node = node.get(command_lower[i])
+                if node is None:
+                    break
+                if "_end" in node:
+                    yield node["_end"]
+    
+    def check_command(self, command: str) -> SecurityResult:
         """Проверяет команду на безопасность"""
-        result = {
-            "safe": True,
-            "warnings": [],
-            "dangerous_parts": [],
-            "risk_level": "low"
-        }
+        result = SecurityResult()
         
         command_lower = command.lower()
         
-        for dangerous_cmd in self.dangerous_commands:
-            if dangerous_cmd.lower() in command_lower:
-                result["safe"] = False
-                result["dangerous_parts"].append(dangerous_cmd)
-                result["warnings"].append(f"Обнаружена опасная команда: {dangerous_cmd}")
+        for dangerous_cmd in self._find_dangerous_commands(command_lower):
+            if dangerous_cmd in result.dangerous_parts:
+                continue
+            result.safe = False
+            result.dangerous_parts.append(dangerous_cmd)
+            result.warnings.append(f"Обнаружена опасная команда: {dangerous_cmd}")
         
-        for pattern in self.suspicious_patterns:
-            if re.search(pattern, command):
-                result["safe"] = False
-                result["warnings"].append(f"Подозрительный паттерн: {pattern}")
+        found_patterns = {match.lastgroup for match in self.suspicious_re.finditer(command)}
+        for i, pattern in enumerate(self.suspicious_patterns):
+            if f"p{i}" in found_patterns:
+                result.safe = False
+                result.warnings.append(f"Подозрительный паттерн: {pattern}")
         
-        if len(result["dangerous_parts"]) > 2:
-            result["risk_level"] = "high"
-        elif len(result["dangerous_parts"]) > 0:
-            result["risk_level"] = "medium"
+        result.risk_level = RISK_LEVELS[min(len(result.dangerous_parts), 3)]
         
         return result
 
 class MessageHistory:
     def __init__(self, limit: int = 50):
         self.limit = limit
-        self.messages = []
+        self.messages = deque(maxlen=max(limit, 0))
     
     def add_message(self, role: str, content: str):
         """Добавляет сообщение в историю"""
         self.messages.append({
             "role": role,
             "content": content,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": time.time()
         })
-        
-        if len(self.messages) > self.limit:
-            self._compress_history()
-    
-    def _compress_history(self):
-        """Сжимает историю, сохраняя важные сообщения"""
-        if len(self.messages) > self.limit:
-            recent = self.messages[-20:]
-            old_compressed = self.messages[:-20:5]
-            self.messages = old_compressed + recent
     
     def get_history(self) -> List[Dict]:
         """Возвращает историю сообщений"""
-        return self.messages
+        return list(self.messages)
     
     def clear(self):
         """Очищает историю"""
-        self.messages = []
+        self.messages.clear()
 
-class CommandExecutor:
-    def __init__(self, os_type: str = "windows"):
-        self.os_type = os_type
+class OutputTail:
+    """Хранит только последние OUTPUT_TAIL_BYTES байт потока вывода"""
+    
+    def __init__(self):
+        self.buffer = bytearray()
+        self.truncated = False
+    
+    async def read_from(self, stream):
+        """Читает поток до конца"""
+        while True:
+            chunk = await stream.read(OUTPUT_TAIL_BYTES)
+            if not chunk:
+                break
+            self.buffer.extend(chunk)
+            if len(self.buffer) > OUTPUT_TAIL_BYTES:
+                del self.buffer[:-OUTPUT_TAIL_BYTES]
+                self.truncated = True
     
-    def execute_command(self, command: str) -> Dict:
+    def decode(self, encoding: str) -> str:
+        """Возвращает сохранённый вывод в виде строки"""
+        text = self.buffer.decode(encoding, errors="replace")
+        return "...\n" + text if self.truncated else text
+
+class CommandExecutor:
+    async def execute_command(self, command: str) -> Dict:
         """Выполняет команду и возвращает результат"""
         try:
-            if self.os_type == "windows":
-                result = subprocess.run(
-                    command, 
-                    shell=True, 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=30
+            if os.name == "nt":
+                process = await asyncio.create_subprocess_shell(
+                    command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP
                 )
-            else:  # linux
-                result = subprocess.run(
-                    command, 
-                    shell=True, 
-                    capture_output=True, 
-                    text=True, 
-                    timeout=30
+            else:
+                process = await asyncio.create_subprocess_shell(
+                    command,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    start_new_session=True
                 )
             
+            stdout_tail = OutputTail()
+            stderr_tail = OutputTail()
+            readers = asyncio.gather(
+                stdout_tail.read_from(process.stdout),
+                stderr_tail.read_from(process.stderr)
+            )
+            try:
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=30)
+                    timed_out = False
+                except asyncio.TimeoutError:
+                    self._kill_process_tree(process)
+                    timed_out = True
+                await self._finish_reading(process, readers)
+            except asyncio.CancelledError:
+                # Бот останавливается: команда не должна пережить его
+                self._kill_process_tree(process)
+                readers.cancel()
+                process._transport.close()
+                await asyncio.gather(readers, return_exceptions=True)
+                raise
+            
+            if timed_out:
+                return {
+                    "success": False,
+                    "error": "Команда превысила лимит времени выполнения (30 сек)"
+                }
+            
+            encoding = locale.getpreferredencoding(False)
             return {
                 "success": True,
-                "stdout": result.stdout,
-                "stderr": result.stderr,
-                "returncode": result.returncode
-            }
-        except subprocess.TimeoutExpired:
-            return {
-                "success": False,
-                "error": "Команда превысила лимит времени выполнения (30 сек)"
+                "stdout": stdout_tail.decode(encoding),
+                "stderr": stderr_tail.decode(encoding),
+                "returncode": process.returncode
             }
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e)
             }
+    
+    async def _finish_reading(self, process, readers):
+        """Дочитывает вывод завершённого процесса"""
+        # Каналы читаются до EOF, иначе заполненный канал не даст процессу завершиться.
+        # Потомок, покинувший группу процессов, может держать канал открытым вечно,
+        # поэтому ждём не дольше OUTPUT_DRAIN_TIMEOUT и закрываем каналы сами.
+        try:
+            await asyncio.wait_for(readers, timeout=OUTPUT_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            process._transport.close()
+        await process.wait()
+    
+    def _kill_process_tree(self, process):
+        """Завершает процесс вместе со всеми дочерними процессами"""
+        try:
+            if os.name == "nt":
+                process.send_signal(signal.CTRL_BREAK_EVENT)
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
 
 class DiscordBot:
+    APPROVAL_HEADERS = {
+        level: f"{color} **ВНИМАНИЕ! Потенциально опасная команда**"
+        for level, color in {"low": "🟢", "medium": "🟡", "high": "🔴"}.items()
+    }
+    
     def __init__(self, config: Dict):
         self.config = config
         self.history = MessageHistory(config.get("message_history_limit", 50))
         self.security_checker = SecurityChecker(config.get("dangerous_commands", []))
-        self.executor = CommandExecutor(config.get("os_type", "windows"))
+        self.executor = CommandExecutor()
         self.pending_commands = {}
+        self.loop = None
+        self.loop_lock = threading.Lock()
+        self.stopped = False
         self.model_type = config.get("model_type", "g4f")
         self.ollama_model = config.get("ollama_model", "")
+        self.ollama_client = None
+        self.update_settings()
         
         intents = discord.Intents.default()
         intents.message_content = True
@@ -165,6 +292,16 @@ class DiscordBot:
         
         self.setup_commands()
     
+    def update_settings(self):
+        """Перечитывает из конфигурации настройки, используемые при обработке сообщений"""
+        self.os_type = self.config.get("os_type", "windows")
+        self.max_command_length = self.config.get("max_command_length", 1000)
+        self.auto_approve_safe = self.config.get("auto_approve_safe", False)
+        self.system_prompt = f"Ты помощник для выполнения команд в {self.os_type}. Когда нужно выполнить команду, напиши её в формате: COMMAND: <команда>"
+        self.g4f_model = g4f.models.ModelUtils.convert.get(
+            self.config.get("g4f_model_name", g4f.models.gpt_4.name), g4f.models.gpt_4
+        )
+    
     def setup_commands(self):
         @self.bot.event
         async def on_ready():
@@ -181,23 +318,22 @@ class DiscordBot:
                 
                 if self.model_type == "g4f":
                     response = await g4f.ChatCompletion.create_async(
-                        model=self.config.get("g4f_model", g4f.models.gpt_4),
+                        model=self.g4f_model,
                         messages=[
-                            {"role": "system", "content": f"Ты помощник для выполнения команд в {self.config['os_type']}. Когда нужно выполнить команду, напиши её в формате: COMMAND: <команда>"},
+                            {"role": "system", "content": self.system_prompt},
                             {"role": "system", "content": f"История: {history_context}"},
                             {"role": "user", "content": question}
                         ]
                     )
                 elif self.model_type == "ollama":
-                    import ollama
-                    response = ollama.chat(
+                    response = (await self.ollama_client.chat(
                         model=self.ollama_model,
                         messages=[
-                            {"role": "system", "content": f"Ты помощник для выполнения команд в {self.config['os_type']}. Когда нужно выполнить команду, напиши её в формате: COMMAND: <команда>"},
+                            {"role": "system", "content": self.system_prompt},
                             {"role": "system", "content": f"История: {history_context}"},
                             {"role": "user", "content": question}
                         ]
-                    )['message']['content']
+                    ))['message']['content']
                     print(f"Ollama response: {response}")
                 else:
                     raise ValueError("Неизвестный тип модели")
@@ -250,83 +386,84 @@ class DiscordBot:
     
     async def _handle_command_response(self, ctx, response: str):
         """Обрабатывает ответ AI с командой"""
-        lines = response.split('\n')
-        commands = []
-        text_parts = []
-        
-        for line in lines:
-            if line.strip().startswith('COMMAND:'):
-                command = line.replace('COMMAND:', '').strip()
-                commands.append(command)
-            else:
-                text_parts.append(line)
+        commands = [command.replace('COMMAND:', '').strip() for command in COMMAND_LINE_RE.findall(response)]
+        text_response = COMMAND_LINE_RE.sub('', response).strip()
         
-        if text_parts:
-            text_response = '\n'.join(text_parts).strip()
-            if text_response:
-                await ctx.send(f"🤖 **Ответ AI:**\n{text_response}")
+        if text_response:
+            await ctx.send(f"🤖 **Ответ AI:**\n{text_response}")
         
         for command in commands:
             await self._execute_with_security_check(ctx, command)
     
     async def _execute_with_security_check(self, ctx, command: str):
         """Выполняет команду с проверкой безопасности"""
-        if len(command) > self.config.get("max_command_length", 1000):
+        if len(command) > self.max_command_length:
             await ctx.send("❌ Команда слишком длинная")
             return
         
         security_result = self.security_checker.check_command(command)
         
-        if security_result["safe"] or self.config.get("auto_approve_safe", False):
+        if security_result.safe or self.auto_approve_safe:
             await self._execute_command_directly(ctx, command)
         else:
             await self._request_approval(ctx, command, security_result)
     
-    async def _request_approval(self, ctx, command: str, security_result: Dict):
+    async def _request_approval(self, ctx, command: str, security_result: SecurityResult):
         """Запрашивает подтверждение для выполнения опасной команды"""
-        command_id = hashlib.md5(command.encode()).hexdigest()[:8]
+        command_id = hashlib.sha256(command.encode()).hexdigest()[:8]
         self.pending_commands[command_id] = command
         
-        risk_colors = {"low": "🟢", "medium": "🟡", "high": "🔴"}
-        risk_color = risk_colors.get(security_result["risk_level"], "🟡")
-        
-        warning_text = f"{risk_color} **ВНИМАНИЕ! Потенциально опасная команда**\n"
-        warning_text += f"📋 **Команда:** `{command}`\n"
-        warning_text += f"⚠️ **Уровень риска:** {security_result['risk_level']}\n"
+        parts = [
+            self.APPROVAL_HEADERS.get(security_result.risk_level, self.APPROVAL_HEADERS["medium"]),
+            f"📋 **Команда:** `{command}`",
+            f"⚠️ **Уровень риска:** {security_result.risk_level}"
+        ]
         
-        if security_result["warnings"]:
-            warning_text += "🚨 **Предупреждения:**\n"
-            for warning in security_result["warnings"]:
-                warning_text += f"• {warning}\n"
+        if security_result.warnings:
+            parts.append("🚨 **Предупреждения:**")
+            parts.extend(f"• {warning}" for warning in security_result.warnings)
         
-        warning_text += f"\n🔧 Для выполнения используйте: `!approve {command_id}`"
+        parts.append(f"\n🔧 Для выполнения используйте: `!approve {command_id}`")
         
-        await ctx.send(warning_text)
+        await ctx.send("\n".join(parts))
     
     async def _execute_command_directly(self, ctx, command: str):
-        """Выполняет команду напрямую"""
-        await ctx.send(f"⚙️ Выполняю команду: `{command}`")
-        
-        result = self.executor.execute_command(command)
+        """Выполняет команду напрямую и отправляет результат одним сообщением"""
+        result = await self.executor.execute_command(command)
         
+        header = f"⚙️ **Команда:** `{command}`"
         if result["success"]:
-            output = ""
-            if result["stdout"]:
-                output += f"📤 **Вывод:**\n```\n{result['stdout']}\n```\n"
-            if result["stderr"]:
-                output += f"⚠️ **Предупреждения:**\n```\n{result['stderr']}\n```\n"
-            if result["returncode"] != 0:
-                output += f"🔴 **Код возврата:** {result['returncode']}\n"
-            
-            if not output:
-                output = "✅ Команда выполнена успешно"
+            stdout, stderr = result["stdout"], result["stderr"]
+            footer = f"🔴 **Код возврата:** {result['returncode']}" if result["returncode"] != 0 else ""
+            # Обрезаем потоки с начала, чтобы в сообщение попали конец вывода и код возврата
+            budget = max(MESSAGE_LIMIT - len(header) - len(footer) - 100, 0)
+            stderr = self._tail_text(stderr, max(budget // 2, budget - len(stdout)))
+            stdout = self._tail_text(stdout, budget - len(stderr))
             
-            if len(output) > 1800:
-                output = output[:1800] + "\n... (вывод обрезан)"
-            
-            await ctx.send(output)
+            parts = [header]
+            if stdout:
+                parts.append(f"📤 **Вывод:**\n```\n{stdout}\n```")
+            if stderr:
+                parts.append(f"⚠️ **Предупреждения:**\n```\n{stderr}\n```")
+            if footer:
+                parts.append(footer)
+            if len(parts) == 1:
+                parts.append("✅ Команда выполнена успешно")
         else:
-            await ctx.send(f"❌ **Ошибка выполнения:**\n```\n{result['error']}\n```")
+            error = self._tail_text(result["error"], max(MESSAGE_LIMIT - len(header) - 100, 0))
+            parts = [header, f"❌ **Ошибка выполнения:**\n```\n{error}\n```"]
+        
+        output = '\n'.join(parts)
+        if len(output) > MESSAGE_LIMIT:
+            output = output[:MESSAGE_LIMIT] + "\n... (вывод обрезан)"
+        
+        await ctx.send(output)
+    
+    def _tail_text(self, text: str, limit: int) -> str:
+        """Оставляет последние limit символов текста"""
+        if len(text) <= limit:
+            return text
+        return "...\n" + text[len(text) - limit + 4:] if limit > 4 else ""
     
     def _build_context(self) -> str:
         """Строит контекст из истории сообщений"""
@@ -348,7 +485,47 @@ class DiscordBot:
         if not token:
             raise ValueError("Discord токен не указан")
         
-        self.bot.run(token)
+        with self.loop_lock:
+            if self.stopped:
+                return
+            self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        discord.utils.setup_logging()
+        try:
+            self.loop.run_until_complete(self._start(token))
+        finally:
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            with self.loop_lock:
+                self.loop.close()
+    
+    def stop(self):
+        """Останавливает бота из другого потока"""
+        with self.loop_lock:
+            # Если цикл ещё не создан, run() увидит флаг и не станет запускать бота
+            self.stopped = True
+            if not self.loop or self.loop.is_closed():
+                return
+            future = asyncio.run_coroutine_threadsafe(self.bot.close(), self.loop)
+        future.result(timeout=5)
+    
+    async def _start(self, token: str):
+        """Подключает бота к Discord и закрывает его при завершении"""
+        if self.model_type == "ollama":
+            # Один клиент на всё время работы бота, чтобы переиспользовать соединения
+            import ollama
+            self.ollama_client = ollama.AsyncClient()
+        
+        try:
+            async with self.bot:
+                await self.bot.start(token)
+        finally:
+            if self.ollama_client:
+                await self.ollama_client.close()
+                self.ollama_client = None
 
 class BotGUI:
     def __init__(self):
@@ -362,7 +539,7 @@ class BotGUI:
         """Загружает конфигурацию"""
         try:
             with open(CONFIG_PATH, 'rb') as f:
-                config = pickle.load(f)
+                config = orjson.loads(f.read())
                 for key, value in DEFAULT_CONFIG.items():
                     if key not in config:
                         config[key] = value
@@ -373,7 +550,7 @@ class BotGUI:
     def _save_config(self):
         """Сохраняет конфигурацию"""
         with open(CONFIG_PATH, 'wb') as f:
-            pickle.dump(self.config, f)
+            f.write(orjson.dumps(self.config, option=orjson.OPT_INDENT_2))
     
     def _get_available_ollama_models(self) -> List[str]:
         """Получает список доступных моделей Ollama"""
@@ -430,12 +607,12 @@ class BotGUI:
         
         self.g4f_provider_dropdown = ft.Dropdown(
             label="G4F Provider",
-            value=self.config.get("g4f_model", g4f.models.gpt_4),
+            value=self.config.get("g4f_model_name", g4f.models.gpt_4.name),
             options=[
-                ft.dropdown.Option(g4f.models.gpt_4, g4f.models.gpt_4.name),
-                ft.dropdown.Option(g4f.models.gpt_4_1_mini, g4f.models.gpt_4_1_mini.name),
-                ft.dropdown.Option(g4f.models.llama_2_70b, g4f.models.llama_2_70b.name),
-                ft.dropdown.Option(g4f.models.llama_3_1_405b, g4f.models.llama_3_1_405b.name),
+                ft.dropdown.Option(g4f.models.gpt_4.name),
+                ft.dropdown.Option(g4f.models.gpt_4_1_mini.name),
+                ft.dropdown.Option(g4f.models.llama_2_70b.name),
+                ft.dropdown.Option(g4f.models.llama_3_1_405b.name),
             ],
             width=200,
             visible=self.config.get("model_type") == "g4f"
@@ -576,9 +753,9 @@ class BotGUI:
         """Останавливает бота"""
         if self.bot_instance:
             try:
-                asyncio.run(self.bot_instance.bot.close())
-            except:
-                pass
+                self.bot_instance.stop()
+            except Exception as ex:
+                self.log_text.value += f"[{datetime.now().strftime('%H:%M:%S')}] Ошибка остановки: {str(ex)}\n"
             self.bot_instance = None
         
         self.status_text.value = "🔴 Бот остановлен"
@@ -597,14 +774,21 @@ class BotGUI:
             self.config["os_type"] = self.os_dropdown.value
             self.config["model_type"] = self.model_type_dropdown.value
             if self.config["model_type"] == "g4f":
-                self.config["g4f_model"] = self.g4f_provider_dropdown.value
+                self.config["g4f_model_name"] = self.g4f_provider_dropdown.value
             elif self.config["model_type"] == "ollama":
                 self.config["ollama_model"] = self.ollama_model_dropdown.value
             self.config["message_history_limit"] = int(self.history_limit_field.value)
             self.config["auto_approve_safe"] = self.auto_approve_checkbox.value
             
-            dangerous_commands = [cmd.strip() for cmd in self.dangerous_commands_field.value.split(",")]
-            self.config["dangerous_commands"] = [cmd for cmd in dangerous_commands if cmd]
+            dangerous_commands = sorted({
+                cmd.strip().lower() for cmd in self.dangerous_commands_field.value.split(",") if cmd.strip()
+            })
+            if dangerous_commands != self.config.get("dangerous_commands") and self.bot_instance:
+                self.bot_instance.security_checker.update_dangerous_commands(dangerous_commands)
+            self.config["dangerous_commands"] = dangerous_commands
+            
+            if self.bot_instance:
+                self.bot_instance.update_settings()
             
             self._save_config()
             